@@ -0,0 +1,165 @@
+import argparse
+import cProfile
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+import numpy
+import curvefitting
+import knn
+import parseenum
+from loan import Loan
+
+def CategorizeBySort(x, y, m):
+    """
+    Categorize as it was done before SelectNearest, with a full sort
+    """
+    dx = numpy.sqrt(numpy.sum(numpy.square(x[:,:] - m), axis=1))
+    dy = numpy.sqrt(numpy.sum(numpy.square(y[:,:] - m), axis=1))
+    xx = numpy.array([dx,numpy.zeros(len(dx))])
+    yy = numpy.array([dy,numpy.ones(len(dy))])
+    zz = numpy.concatenate((xx, yy), axis = 1)
+    z0,z1 = zz
+    ind = numpy.lexsort((z1,z0))
+    s = [(z0[i],z1[i]) for i in ind]
+    s0,s1 = zip(*s)
+    n = numpy.count_nonzero(s1[0:101])
+    return 1 if n > 50 else 0
+
+def KnnCategorize(size, categorize=knn.Categorize):
+    knn.model_size = size
+    x, y = knn.GetModel()
+    m = numpy.array([3.0, 3.0])
+    if categorize(x, y, m) != knn.Categorize(x, y, m):
+        raise RuntimeError(f"{categorize.__name__} differs from knn.Categorize at model_size {size}")
+    return lambda: categorize(x, y, m)
+
+def CurveFittingGetModel(N, M):
+    x, y = curvefitting.GetSamples(N)
+    return lambda: curvefitting.GetModel(x, y, M, 0.001)
+
+def LoanAmortizationSchedule(months):
+    loan = Loan(300000, 0.065, months=months)
+    return loan.amortization_schedule
+
+def LoanSchedule(mode, months):
+    def Schedule():
+        for row in Loan(300000, 0.065, months=months, mode=mode).iter_schedule():
+            pass
+    return Schedule
+
+def ParseEnum(parse, value):
+    return lambda: parse(value)
+
+# Cold start snippets, each run in a new interpreter
+STARTUP = {
+    "python": "",
+    "import curvefitting": "import curvefitting",
+    "import knn": "import knn",
+    "import loan": "import loan",
+    "import parseenum": "import parseenum",
+    "curvefitting.GetModel": "import curvefitting; x, y = curvefitting.GetSamples(100); curvefitting.GetModel(x, y, 3, 0.001)",
+    "knn.Categorize": "import knn; x, y = knn.GetModel(); knn.Categorize(x, y, (3, 3))",
+}
+
+def Startup(code):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return lambda: subprocess.run([sys.executable, "-c", code], cwd=directory, check=True)
+
+def Benchmarks():
+    """
+    Name and setup of every benchmark; setup returns the function to time
+    """
+    for size in (1000, 10000, 100000, 1000000):
+        yield f"knn.Categorize/model_size={size}", lambda size=size: KnnCategorize(size)
+    for size in (1000, 10000, 100000):
+        yield f"knn.CategorizeBySort/model_size={size}", lambda size=size: KnnCategorize(size, CategorizeBySort)
+    for N in (100, 10000):
+        for M in (3, 9):
+            yield f"curvefitting.GetModel/N={N},M={M}", lambda N=N, M=M: CurveFittingGetModel(N, M)
+    for months in (12, 120, 360):
+        yield f"loan.amortization_schedule/months={months}", lambda months=months: LoanAmortizationSchedule(months)
+        for mode in (None, "float", "decimal"):
+            yield f"loan.iter_schedule/mode={mode},months={months}", lambda mode=mode, months=months: LoanSchedule(mode, months)
+    yield "parseenum.parseAccessMask", lambda: ParseEnum(parseenum.parseAccessMask, 0x12345678)
+    yield "parseenum.parseCreateOption", lambda: ParseEnum(parseenum.parseCreateOption, 0x00ff00ff)
+    yield "parseenum.parseCreateDisposition", lambda: ParseEnum(parseenum.parseCreateDisposition, 3)
+    for name, code in STARTUP.items():
+        yield f"startup/{name}", lambda code=code: Startup(code)
+
+def Measure(f, repeat):
+    """
+    Best seconds per call of f over repeat runs of about 0.2 seconds each
+    """
+    timer = timeit.Timer(f)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * 0.2 / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def PeakMemory(f):
+    """
+    Peak bytes allocated by one call of f
+    """
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def Regressions(results, baseline, threshold):
+    """
+    Names of the benchmarks more than threshold times slower than baseline
+    """
+    return [name for name, result in results.items()
+            if name in baseline and result["seconds"] > threshold * baseline[name]["seconds"]]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the hot paths and cold start of knn, curvefitting, loan and parseenum")
+    parser.add_argument("-f", "--Filter", help="Only run benchmarks whose name contains this", default="")
+    parser.add_argument("-r", "--Repeat", help="Timed runs per benchmark, the best is reported", type=int, default=5)
+    parser.add_argument("-o", "--Output", help="Write the results to this JSON file")
+    parser.add_argument("-b", "--Baseline", help="Compare against the results in this JSON file")
+    parser.add_argument("-t", "--Threshold", help="Slowdown against --Baseline reported as a regression", type=float, default=1.25)
+    parser.add_argument("-p", "--Profile", help="Write a cProfile of each benchmark to this directory")
+    parser.add_argument("-m", "--Memory", help="Measure peak memory of one call with tracemalloc", action="store_true")
+    args = parser.parse_args()
+
+    numpy.random.seed(0)
+    baseline = {}
+    if args.Baseline:
+        with open(args.Baseline) as f:
+            baseline = json.load(f)["benchmarks"]
+    if args.Profile:
+        os.makedirs(args.Profile, exist_ok=True)
+
+    results = {}
+    print("benchmark\tseconds per call\tpeak bytes\tvs baseline")
+    for name, setup in Benchmarks():
+        if args.Filter not in name:
+            continue
+        f = setup()
+        result = {"seconds": Measure(f, args.Repeat)}
+        if args.Memory:
+            result["peak_bytes"] = PeakMemory(f)
+        if args.Profile:
+            profile = cProfile.Profile()
+            profile.runcall(f)
+            profile.dump_stats(os.path.join(args.Profile, name.replace("/", "_") + ".prof"))
+        results[name] = result
+        ratio = f"{result['seconds'] / baseline[name]['seconds']:.2f}" if name in baseline else "-"
+        print(f"{name}\t{result['seconds']:.9f}\t{result.get('peak_bytes', '-')}\t{ratio}")
+
+    if args.Output:
+        with open(args.Output, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "numpy": numpy.__version__,
+                "benchmarks": results,
+            }, f, indent=2)
+    regressions = Regressions(results, baseline, args.Threshold)
+    if regressions:
+        sys.exit("Regressions: " + ", ".join(regressions))
@@ -1,35 +1,28 @@
 import numpy
 import numpy.linalg
 import numpy.random
-import matplotlib.pyplot as fig
 
 def GetSamples(N):
     x = numpy.linspace(0, 1, num=N)
     y = numpy.sin(2 * numpy.pi * x) + 0.3 * numpy.random.randn(N)
     return x, y
 
-def GetSampleMatrix(x, M):
+def GetSampleMatrix(x, M, dtype=numpy.float64):
     """
-    Duplicate x for 1+M rows
-    0   x[1] x[2] ... x[N]
-    1   x[1] x[2] ... x[N]
-    2   x[1] x[2] ... x[N]
-        ...
-    M   x[1] x[2] ... x[N]
-    """
-    N = len(x)
-    X = x * numpy.ones((1+M, N))
-
-    """
-    Raise row i to the i-th power
+    Vandermonde matrix, row i holds x raised to the i-th power
     0   (x[1])^0 (x[2])^0 ... (x[N])^0
     1   (x[1])^1 (x[2])^1 ... (x[N])^1
     2   (x[1])^2 (x[2])^2 ... (x[N])^2
         ...
     M   (x[1])^M (x[2])^M ... (x[N])^M
+
+    Each row is the previous one times x, so no power is taken.
     """
-    n = numpy.arange(1+M).reshape((1+M,1))
-    X = X ** n
+    N = len(x)
+    X = numpy.empty((1+M, N), dtype=dtype)
+    X[0] = 1
+    for i in range(1, 1+M):
+        numpy.multiply(X[i-1], x, out=X[i])
 
     return X
 
@@ -81,25 +74,242 @@ def GetModel(x, y, M, l):
 
     return w, e
 
+def GetModelQR(x, y, M, l, dtype=numpy.float64):
+    """
+    Polynomial model as GetModel, solved by QR instead of normal equations
+    The ridge problem is the least squares problem
+        | X^T     |       | y |
+        | sqrt(L) | w  ~  | 0 |
+    whose residual norm is the numerator of GetError. The QR factorization
+    of the augmented matrix keeps the condition number of X instead of
+    squaring it as X * X^T does.
+    """
+
+    N = len(x)
+    A = numpy.zeros((N + 1+M, 1+M), dtype=dtype)
+    A[:N, 0] = 1
+    for i in range(1, 1+M):
+        numpy.multiply(A[:N, i-1], x, out=A[:N, i])
+    A[N:] = numpy.sqrt(GetRegularizationMatrix(M, l))
+    b = numpy.zeros(N + 1+M, dtype=dtype)
+    b[:N] = y
+
+    Q, R = numpy.linalg.qr(A)
+    w = numpy.linalg.solve(R, numpy.dot(Q.T, b))
+
+    e = numpy.linalg.norm(numpy.dot(A, w) - b) / N
+
+    return w, e
+
+def GetRegularizationPath(x, y, M, lambdas):
+    """
+    Polynomial models of GetModel for every regularization parameter in
+    lambdas, as rows of W, and their errors e
+
+    The unregularized w[0] only shifts the fit to the mean, so the other
+    coefficients are a ridge fit of the centered powers of x
+        Xc = U S V^T,  w[1:] = V S/(S^2+l) U^T yc
+        w[0] = mean(y) - mean(X[1:]) w[1:]
+    Xc is decomposed once; each l then only rescales S.
+    """
+
+    X = GetSampleMatrix(x, M)[1:].T
+    mx = numpy.mean(X, axis=0)
+    my = numpy.mean(y)
+    U, S, Vt = numpy.linalg.svd(X - mx, full_matrices=False)
+    yc = y - my
+    c = numpy.dot(U.T, yc)
+    r = yc - numpy.dot(U, c)
+    r = numpy.dot(r, r)
+
+    l = numpy.asarray(lambdas, dtype=float).reshape((-1, 1))
+    S2 = S * S + l
+    nonzero = S2 > 0
+    f = numpy.divide(S, S2, out=numpy.zeros_like(S2), where=nonzero)
+    g = numpy.where(nonzero, numpy.divide(l, S2, out=numpy.zeros_like(S2), where=nonzero), 1)
+
+    W = numpy.empty((len(l), 1+M))
+    W[:, 1:] = numpy.dot(f * c, Vt)
+    W[:, 0] = my - numpy.dot(W[:, 1:], mx)
+
+    # Residual and penalty in the singular basis
+    P = r + numpy.sum(numpy.square(g * c), axis=1)
+    V = numpy.sum(numpy.square(f * c), axis=1)
+    e = numpy.sqrt(P + l[:, 0] * V) / len(y)
+
+    return W, e
+
+def Predict(W, x, out=None, chunk=65536):
+    """
+    Values at x of the polynomial models in the rows of W
+    Row k of the result is evaluated by Horner's scheme
+        (...(W[k,M] x + W[k,M-1]) x + ... ) x + W[k,0]
+    chunk samples at a time, in place in out, so no temporary array is
+    allocated besides the (K, N) result. A single model w gives 1-D values.
+    """
+
+    W = numpy.asarray(W)
+    x = numpy.asarray(x)
+    single = W.ndim == 1
+    W = numpy.atleast_2d(W)
+    if out is None:
+        out = numpy.empty((len(W), len(x)), dtype=numpy.result_type(W, x))
+    elif single and out.ndim == 1:
+        out = out.reshape((1, -1))
+    if out.shape != (len(W), len(x)):
+        raise ValueError(f"out must have shape {(len(W), len(x))}")
+
+    for s in range(0, len(x), chunk):
+        o = out[:, s:s+chunk]
+        xs = x[s:s+chunk]
+        o[...] = W[:, -1:]
+        for i in range(W.shape[1] - 2, -1, -1):
+            o *= xs
+            o += W[:, i:i+1]
+
+    return out[0] if single else out
+
+class IncrementalModel:
+    """
+    Polynomial model as GetModel, fitted to samples added chunk by chunk
+    Only the (1+M)x(1+M) triangular factor R of the sample matrix seen so
+    far, z = Q^T y and the sum of squared residuals outside the span of R
+    are kept, so memory does not grow with the number of samples.
+    """
+
+    def __init__(self, M, l, dtype=numpy.float64):
+        self.M = M
+        self.l = l
+        self.dtype = dtype
+        self.N = 0
+        self.R = numpy.zeros((0, 1+M), dtype=dtype)
+        self.z = numpy.zeros(0, dtype=dtype)
+        self.r = 0.0
+
+    def Add(self, x, y, chunk=1048576):
+        """
+        Add samples x, y, such as memory-mapped arrays, chunk at a time
+        """
+        for i in range(0, len(x), chunk):
+            xi = numpy.asarray(x[i:i+chunk], dtype=self.dtype)
+            yi = numpy.asarray(y[i:i+chunk], dtype=self.dtype)
+            A = numpy.concatenate((self.R, GetSampleMatrix(xi, self.M, self.dtype).T))
+            b = numpy.concatenate((self.z, yi))
+            Q, self.R = numpy.linalg.qr(A)
+            self.z = numpy.dot(Q.T, b)
+            P = b - numpy.dot(Q, self.z)
+            self.r += float(numpy.dot(P, P))
+            self.N += len(xi)
+
+    def Update(self, chunks):
+        """
+        Add every (x, y) chunk of an iterable
+        """
+        for x, y in chunks:
+            self.Add(x, y)
+
+    def GetModel(self):
+        """
+        Model w and error e of the samples added so far
+        """
+        if self.N == 0:
+            raise ValueError("Must add samples first")
+        A = numpy.concatenate((self.R, numpy.sqrt(GetRegularizationMatrix(self.M, self.l)).astype(self.dtype)))
+        b = numpy.concatenate((self.z, numpy.zeros(1+self.M, dtype=self.dtype)))
+        w = numpy.linalg.lstsq(A, b, rcond=None)[0]
+        P = numpy.dot(A, w) - b
+        e = numpy.sqrt(numpy.dot(P, P) + self.r) / self.N
+        return w, e
+
+def CrossValidate(x, y, Ms, lambdas, folds=5, seed=0, workers=None):
+    """
+    k-fold cross-validation of GetModel over every degree in Ms and every
+    regularization parameter in lambdas
+
+    Samples are shuffled into folds by seed and the folds are fitted in a
+    process pool. Each fold decomposes its samples once per degree and
+    reuses that for every l. Returns the best (M, l), its model w fitted to
+    all samples, and the mean validation GetError (with l = 0) as a table
+    with a row per degree and a column per l.
+    """
+
+    order = numpy.random.default_rng(seed).permutation(len(x))
+    parts = numpy.array_split(order, folds)
+    trains = [numpy.concatenate(parts[:i] + parts[i+1:]) for i in range(folds)]
+    args = ([x[t] for t in trains], [y[t] for t in trains],
+            [x[v] for v in parts], [y[v] for v in parts],
+            [Ms] * folds, [lambdas] * folds)
+    if workers == 1:
+        errors = list(map(ValidateFold, *args))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as pool:
+            errors = list(pool.map(ValidateFold, *args))
+    table = numpy.mean(errors, axis=0)
+
+    i, j = numpy.unravel_index(numpy.argmin(table), table.shape)
+    M, l = Ms[i], lambdas[j]
+    w, _ = GetModel(x, y, M, l)
+
+    return M, l, w, table
+
+def ValidateFold(x, y, xv, yv, Ms, lambdas):
+    """
+    Validation errors on (xv, yv) of the models fitted to (x, y)
+    """
+    E = numpy.empty((len(Ms), len(lambdas)))
+    for i, M in enumerate(Ms):
+        W, e = GetRegularizationPath(x, y, M, lambdas)
+        X = GetSampleMatrix(xv, M)
+        for j, w in enumerate(W):
+            E[i, j] = GetError(X, yv, w, 0)
+    return E
+
+def TestCrossValidation(N, M, folds, seed, workers):
+    numpy.random.seed(seed)
+    x, y = GetSamples(N)
+    Ms = list(range(1+M))
+    lambdas = numpy.concatenate(([0], numpy.logspace(-8, 0, num=9)))
+    M, l, w, table = CrossValidate(x, y, Ms, lambdas, folds, seed, workers)
+    print("M\\l\t" + "\t".join(f"{l:g}" for l in lambdas))
+    for m, row in zip(Ms, table):
+        print(f"{m}\t" + "\t".join(f"{e:.6f}" for e in row))
+    print(f"Best M: {M}")
+    print(f"Best l: {l:g}")
+    print(numpy.poly1d(w[::-1]))
+
 def TestRegularization(N, M):
+    import matplotlib.pyplot as fig
     x, y = GetSamples(N)
     fig.plot(x, y, '+')
 
     u = numpy.linspace(0,1, 1000)
     t = numpy.sin(2 * numpy.pi * u)
-    fig.plot(u, t, label='$\sin(2 \pi x)$')
+    fig.plot(u, t, label=r'$\sin(2 \pi x)$')
 
-    for l in numpy.linspace(0, 0.01, num=3):
-        w, e = GetModel(x, y, M, l)
+    lambdas = numpy.linspace(0, 0.01, num=3)
+    W, E = GetRegularizationPath(x, y, M, lambdas)
+    V = Predict(W, u)
+    for l, w, e, v in zip(lambdas, W, E, V):
         p = numpy.poly1d(w[::-1])
         print(p)
 
-        v = p(u)
-        fig.plot(u, v, label='$\lambda$={0}, $e$={1:.3f}'.format(l, e))
+        fig.plot(u, v, label=r'$\lambda$={0}, $e$={1:.3f}'.format(l, e))
 
     fig.legend()
     fig.show()
 
 if __name__ == "__main__":
-    import sys
-    TestRegularization(int(sys.argv[1]), int(sys.argv[2]))
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("N", help="Number of samples", type=int)
+    parser.add_argument("M", help="Polynomial degree, the largest one tried with --CrossValidate", type=int)
+    parser.add_argument("-c", "--CrossValidate", help="Choose M and lambda by cross-validation, without plotting", action="store_true")
+    parser.add_argument("-k", "--Folds", help="Number of cross-validation folds", type=int, default=5)
+    parser.add_argument("-s", "--Seed", help="Random seed for samples and folds", type=int, default=0)
+    parser.add_argument("-w", "--Workers", help="Number of worker processes", type=int, default=None)
+    args = parser.parse_args()
+    if args.CrossValidate:
+        TestCrossValidation(args.N, args.M, args.Folds, args.Seed, args.Workers)
+    else:
+        TestRegularization(args.N, args.M)
@@ -1,3 +1,6 @@
+import json
+import os
+import time
 import numpy
 
 model_size = 1000
@@ -7,40 +10,599 @@ def GetModel():
     y = numpy.random.multivariate_normal([4,4],[[1,0],[0,1]],model_size)
     return x,y
 
+def SelectNearest(d, k, keys):
+    """
+    Indices of the k smallest d, in no particular order
+    Equal d at the k-th place are taken by smallest keys first and then by
+    index, which is the order numpy.lexsort((keys, d)) gives them. Only the
+    ties are sorted; the rest is a partial selection in linear time.
+    """
+    if k >= len(d):
+        return numpy.arange(len(d))
+    t = d[numpy.argpartition(d, k - 1)[k - 1]]
+    less = numpy.flatnonzero(d < t)
+    equal = numpy.flatnonzero(d == t)
+    equal = equal[numpy.argsort(keys[equal], kind="stable")]
+    return numpy.concatenate((less, equal[:k - len(less)]))
+
+def SelectNearestRows(d, k, keys, index):
+    """
+    Positions of the k smallest d in each row, nearest first
+    Equal d are ordered by keys and then by index, as in SelectNearest. keys
+    and index are per position, either per row or shared by all rows. Only
+    the w nearest, which hold every tie of the k-th distance, are sorted.
+    """
+    k = min(k, d.shape[1])
+    t = numpy.partition(d, k - 1, axis=1)[:, k - 1:k]
+    w = numpy.count_nonzero(d <= t, axis=1).max()
+    if w < d.shape[1]:
+        near = numpy.argpartition(d, w - 1, axis=1)[:, :w]
+    else:
+        near = numpy.broadcast_to(numpy.arange(d.shape[1]), d.shape)
+    def Take(a):
+        return numpy.take_along_axis(numpy.broadcast_to(a, d.shape), near, axis=1)
+    ind = numpy.lexsort((Take(index), Take(keys), Take(d)))[:, :k]
+    return numpy.take_along_axis(near, ind, axis=1)
+
+def SquaredDistances(points, queries):
+    """
+    Squared distances from each query to each point, a row per query
+    Summed one dimension at a time, so no (queries, points, d) difference
+    array is made.
+    """
+    d = numpy.zeros((len(queries), len(points)), dtype=numpy.result_type(points, queries))
+    t = numpy.empty_like(d)
+    for j in range(points.shape[1]):
+        numpy.subtract(numpy.ascontiguousarray(points[:, j]), queries[:, j, numpy.newaxis], out=t)
+        numpy.square(t, out=t)
+        d += t
+    return d
+
+def Vote(labels, classes):
+    """
+    Most common label in each row of labels, the smallest one on a tie
+    """
+    labels = numpy.atleast_2d(labels)
+    rows = numpy.arange(len(labels))[:, numpy.newaxis]
+    votes = numpy.bincount((rows * classes + labels).ravel(), minlength=len(labels) * classes)
+    return numpy.argmax(votes.reshape(len(labels), classes), axis=1)
+
+class Model:
+    """
+    Labeled points to categorize by
+    features is a contiguous (n, d) array and labels holds the class
+    0, 1, ..., classes-1 of each row in the smallest integer type that fits.
+    Arrays already in those types are used without a copy, and memmaps,
+    such as those of LoadModel, in any integer type that holds classes-1.
+    With check=False the labels are trusted to be in range and are not
+    read, so opening a model file does not scan it.
+    """
+
+    def __init__(self, features, labels, dtype=numpy.float64, classes=None, check=True):
+        self.features = numpy.ascontiguousarray(features, dtype=dtype)
+        mapped = isinstance(labels, numpy.memmap)
+        labels = numpy.asarray(labels)
+        if self.features.ndim != 2 or len(labels) != len(self.features):
+            raise ValueError("Must provide an (n, d) features array and n labels")
+        if classes is None:
+            classes = int(labels.max()) + 1 if len(labels) else 0
+        if check and len(labels) and (labels.min() < 0 or labels.max() >= classes):
+            raise ValueError(f"Labels must be in 0..{classes - 1}")
+        self.classes = classes
+        smallest = numpy.min_scalar_type(max(self.classes - 1, 0))
+        if not (mapped and labels.dtype.kind in "iu" and numpy.can_cast(smallest, labels.dtype)):
+            labels = labels.astype(smallest, copy=False)
+        self.labels = labels
+
+    def Categorize(self, m, k=101):
+        # Squared distances order the same as distances
+        d = SquaredDistances(self.features, numpy.asarray(m, dtype=self.features.dtype).reshape(1, -1))[0]
+        near = SelectNearest(d, k, self.labels)
+        return int(Vote(self.labels[near], self.classes)[0])
+
+    def CategorizeStream(self, m, k=101, block=8192, chunk=128):
+        """
+        Categorize each row of m, scanning the model block rows at a time
+        Each query keeps its running k nearest, merged with the points of
+        every block that are no farther than its k-th nearest so far. Memory
+        is a few chunk x (k + block) arrays whatever the model size, about
+        50 MB with the defaults. Results are the same as Categorize.
+        """
+        m = numpy.atleast_2d(numpy.asarray(m, dtype=self.features.dtype))
+        c = numpy.empty(len(m), dtype=int)
+        for i in range(0, len(m), chunk):
+            q = m[i:i + chunk]
+            best_d = numpy.empty((len(q), 0), dtype=self.features.dtype)
+            best_l = numpy.empty((len(q), 0), dtype=self.labels.dtype)
+            best_i = numpy.empty((len(q), 0), dtype=int)
+            for s in range(0, len(self.features), block):
+                f = numpy.asarray(self.features[s:s + block])
+                d = SquaredDistances(f, q)
+                l = numpy.asarray(self.labels[s:s + block])
+                n = numpy.arange(s, s + len(f))
+                if best_d.shape[1] == k:
+                    # Pack each row's candidates to the left, padded with
+                    # infinite distances that are never among the k nearest
+                    rows, cols = numpy.nonzero(d <= best_d[:, -1:])
+                    if len(rows) == 0:
+                        continue
+                    counts = numpy.bincount(rows, minlength=len(q))
+                    slots = numpy.arange(len(rows)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+                    shape = (len(q), counts.max())
+                    d, l, n = d[rows, cols], l[cols], n[cols]
+                    packed = numpy.full(shape, numpy.inf, dtype=d.dtype), numpy.zeros(shape, dtype=l.dtype), numpy.zeros(shape, dtype=int)
+                    for a, v in zip(packed, (d, l, n)):
+                        a[rows, slots] = v
+                    d, l, n = packed
+                else:
+                    l = numpy.broadcast_to(l, d.shape)
+                    n = numpy.broadcast_to(n, d.shape)
+                d = numpy.hstack((best_d, d))
+                l = numpy.hstack((best_l, l))
+                n = numpy.hstack((best_i, n))
+                near = SelectNearestRows(d, k, l, n)
+                best_d = numpy.take_along_axis(d, near, axis=1)
+                best_l = numpy.take_along_axis(l, near, axis=1)
+                best_i = numpy.take_along_axis(n, near, axis=1)
+            c[i:i + chunk] = Vote(best_l, self.classes)
+        return c
+
+def Combine(*classes):
+    """
+    Model of the points in classes, where the points in classes[i] have label i
+    """
+    sizes = [len(c) for c in classes]
+    labels = numpy.repeat(numpy.arange(len(classes)), sizes)
+    return Model(numpy.concatenate(classes), labels)
+
+def SaveModel(path, chunks, dtype=numpy.float64, label_dtype=numpy.uint8):
+    """
+    Write (features, labels) chunks as a model in the directory path
+    features and labels are raw row-major arrays, described by model.json.
+    Chunks are written as they come, so the model never has to fit in memory.
+    """
+    os.makedirs(path, exist_ok=True)
+    size = 0
+    dimensions = None
+    classes = 0
+    top = numpy.iinfo(label_dtype).max
+    with open(os.path.join(path, "features"), "wb") as f, open(os.path.join(path, "labels"), "wb") as l:
+        for features, labels in chunks:
+            features = numpy.ascontiguousarray(features, dtype=dtype)
+            labels = numpy.asarray(labels)
+            if features.ndim == 2 and dimensions is None:
+                dimensions = features.shape[1]
+            if features.ndim != 2 or features.shape[1] != dimensions or len(labels) != len(features):
+                raise ValueError("Must provide (n, d) features and n labels with the same d in every chunk")
+            if len(labels) and (labels.min() < 0 or labels.max() > top):
+                raise ValueError(f"Labels must be in 0..{top}")
+            features.tofile(f)
+            labels.astype(label_dtype).tofile(l)
+            size += len(features)
+            if len(labels):
+                classes = max(classes, int(labels.max()) + 1)
+    header = {
+        "size": size,
+        "dimensions": dimensions or 0,
+        "dtype": numpy.dtype(dtype).str,
+        "label_dtype": numpy.dtype(label_dtype).str,
+        "classes": classes,
+    }
+    with open(os.path.join(path, "model.json"), "w") as f:
+        json.dump(header, f)
+
+def LoadModel(path):
+    """
+    Model of the directory path written by SaveModel, memory-mapped read-only
+    """
+    with open(os.path.join(path, "model.json")) as f:
+        header = json.load(f)
+    shape = (header["size"], header["dimensions"])
+    if header["size"] == 0:
+        features = numpy.empty(shape, dtype=header["dtype"])
+        labels = numpy.empty(0, dtype=header["label_dtype"])
+    else:
+        features = numpy.memmap(os.path.join(path, "features"), dtype=header["dtype"], mode="r", shape=shape)
+        labels = numpy.memmap(os.path.join(path, "labels"), dtype=header["label_dtype"], mode="r", shape=shape[:1])
+    return Model(features, labels, dtype=features.dtype, classes=header["classes"], check=False)
+
 def Categorize(x, y, m):
-    # Compute distances
-    dx = numpy.sqrt(numpy.sum(numpy.square(x[:,:] - m), axis=1))
-    dy = numpy.sqrt(numpy.sum(numpy.square(y[:,:] - m), axis=1))
-    # Tag distances with known categorization
-    xx = numpy.array([dx,numpy.zeros(model_size)])
-    yy = numpy.array([dy,numpy.ones(model_size)])
-    # Sort by distances
-    zz = numpy.concatenate((xx, yy), axis = 1)
-    z0,z1 = zz
-    ind = numpy.lexsort((z1,z0))
-    s = [(z0[i],z1[i]) for i in ind]
-    # Take 101 nearest neighbors to categorize m
-    s0,s1 = zip(*s)
-    k = 101
-    n = numpy.count_nonzero(s1[0:k])
-    c = 0
-    if n > 50:
-        c = 1
-
-    return c
+    return Combine(x, y).Categorize(m)
+
+class KDTree:
+    """
+    KD-tree over the rows of points
+    Node i covers points[start[i]:end[i]] of the reordered points, is bounded
+    by the box lo[i]..hi[i] and splits on axis[i] at split[i] into the nodes
+    left[i] and right[i]. Leaves have left[i] == -1.
+    """
+
+    def __init__(self, points, keys=None, leaf_size=64):
+        points = numpy.asarray(points)
+        if points.dtype.kind != "f":
+            points = points.astype(float)
+        if len(points) == 0:
+            raise ValueError("Must provide at least one point")
+        if keys is None:
+            keys = numpy.zeros(len(points), dtype=int)
+        index = numpy.arange(len(points))
+        start, end, parent = [0], [len(points)], [-1]
+        left, right, axis, split = [-1], [-1], [0], [0.0]
+        i = 0
+        while i < len(start):
+            s, e = start[i], end[i]
+            if e - s > leaf_size:
+                # Split the widest side at its median
+                p = points[index[s:e]]
+                a = numpy.argmax(p.max(axis=0) - p.min(axis=0))
+                h = (e - s) // 2
+                order = numpy.argpartition(p[:, a], h)
+                index[s:e] = index[s:e][order]
+                axis[i] = a
+                split[i] = p[order[h], a]
+                for child, (cs, ce) in ((left, (s, s + h)), (right, (s + h, e))):
+                    child[i] = len(start)
+                    start.append(cs)
+                    end.append(ce)
+                    parent.append(i)
+                    left.append(-1)
+                    right.append(-1)
+                    axis.append(0)
+                    split.append(0.0)
+            i += 1
+
+        self.index = index
+        self.points = points[index]
+        self.keys = numpy.asarray(keys)[index]
+        self.start = numpy.array(start)
+        self.end = numpy.array(end)
+        self.parent = numpy.array(parent)
+        self.left = numpy.array(left)
+        self.right = numpy.array(right)
+        self.axis = numpy.array(axis)
+        self.split = numpy.array(split)
+        self.lo = numpy.array([self.points[s:e].min(axis=0) for s, e in zip(start, end)])
+        self.hi = numpy.array([self.points[s:e].max(axis=0) for s, e in zip(start, end)])
+
+    def Leaf(self, queries):
+        """
+        Leaf reached by each query when descending by the split values
+        """
+        node = numpy.zeros(len(queries), dtype=int)
+        rows = numpy.arange(len(queries))
+        inner = self.left[node] >= 0
+        while inner.any():
+            n = node[inner]
+            go = queries[rows[inner], self.axis[n]] < self.split[n]
+            node[inner] = numpy.where(go, self.left[n], self.right[n])
+            inner = self.left[node] >= 0
+        return node
+
+    def Candidates(self, lo, hi, r):
+        """
+        Points in the leaves within squared distance r of the box lo..hi
+        """
+        stack = [0]
+        ranges = []
+        while stack:
+            i = stack.pop()
+            gap = numpy.maximum(numpy.maximum(self.lo[i] - hi, lo - self.hi[i]), 0)
+            if numpy.dot(gap, gap) > r:
+                continue
+            if self.left[i] < 0:
+                ranges.append(numpy.arange(self.start[i], self.end[i]))
+            else:
+                stack.append(self.right[i])
+                stack.append(self.left[i])
+        return numpy.concatenate(ranges)
+
+    def Query(self, queries, k, block=256):
+        """
+        Indices of the k nearest points to each query, nearest first
+        Equal distances are ordered by keys and then by index, the same order
+        numpy.lexsort gives over (keys, distances) of the unordered points.
+
+        Queries are grouped by leaf. Each group finds an upper bound of its
+        k-th distance from the smallest node holding k points, and then only
+        ranks the points of the leaves within that bound.
+        """
+        queries = numpy.asarray(queries, dtype=self.points.dtype)
+        k = min(k, len(self.index))
+        result = numpy.empty((len(queries), k), dtype=int)
+        leaf = self.Leaf(queries)
+        order = numpy.argsort(leaf, kind="stable")
+        runs = numpy.split(order, numpy.flatnonzero(numpy.diff(leaf[order])) + 1)
+        for run in runs:
+            for i in range(0, len(run), block):
+                rows = run[i:i + block]
+                q = queries[rows]
+                node = leaf[rows[0]]
+                while self.end[node] - self.start[node] < k:
+                    node = self.parent[node]
+                d = self.Distances(q, numpy.arange(self.start[node], self.end[node]))
+                r = numpy.partition(d, k - 1, axis=1)[:, k - 1]
+                c = self.Candidates(q.min(axis=0), q.max(axis=0), r.max())
+                d = self.Distances(q, c)
+                near = SelectNearestRows(d, k, self.keys[c], self.index[c])
+                result[rows] = self.index[c[near]]
+        return result
+
+    def Distances(self, queries, c):
+        """
+        Squared distances from each query to the points c
+        """
+        return SquaredDistances(self.points[c], queries)
+
+class Classifier:
+    """
+    k-nearest-neighbor classifier fitted to a Model
+    The KD-tree is built once and shared by every Categorize call.
+    """
+
+    def __init__(self, model, k=101, leaf_size=64):
+        self.k = k
+        self.labels = model.labels
+        self.classes = model.classes
+        self.tree = KDTree(model.features, model.labels, leaf_size)
+
+    def Categorize(self, m, k=None, chunk=65536):
+        """
+        Categorize each row of m, same as Model.Categorize(row)
+        """
+        if k is None:
+            k = self.k
+        m = numpy.atleast_2d(numpy.asarray(m, dtype=self.tree.points.dtype))
+        c = numpy.empty(len(m), dtype=int)
+        for i in range(0, len(m), chunk):
+            ind = self.tree.Query(m[i:i + chunk], k)
+            c[i:i + chunk] = Vote(self.labels[ind], self.classes)
+        return c
+
+    def CategorizeParallel(self, m, k=None, workers=None, processes=False, chunk=16384):
+        """
+        Categorize split into chunks of m across a pool of workers
+        Each chunk is written to its own slice of the result, so the output
+        is the same as Categorize whatever order the chunks finish in.
+        Threads share this classifier. Processes attach to the model, query
+        and result arrays in shared memory instead of receiving pickles.
+        """
+        # Pools are only imported when needed, to keep importing knn fast
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        if k is None:
+            k = self.k
+        if workers is None:
+            workers = os.cpu_count()
+        m = numpy.atleast_2d(numpy.asarray(m, dtype=self.tree.points.dtype))
+        c = numpy.empty(len(m), dtype=int)
+        starts = range(0, len(m), chunk)
+        if not processes:
+            def Chunk(start):
+                c[start:start + chunk] = self.Categorize(m[start:start + chunk], k)
+            with ThreadPoolExecutor(workers) as pool:
+                list(pool.map(Chunk, starts))
+            return c
+
+        arrays = {"labels": self.labels, "classes": numpy.array(self.classes), "m": m, "c": c}
+        arrays.update(("tree." + name, a) for name, a in vars(self.tree).items())
+        blocks, specs = _Share(arrays)
+        try:
+            with ProcessPoolExecutor(workers, initializer=_Attach, initargs=(specs,)) as pool:
+                list(pool.map(_CategorizeChunk, starts, [chunk] * len(starts), [k] * len(starts)))
+            c[:] = _Array(blocks[list(specs).index("c")], specs["c"])
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        return c
+
+def _Share(arrays):
+    """
+    Copy arrays into new shared memory blocks
+    Returns the blocks and the (name, shape, dtype) of each array in them.
+    """
+    from multiprocessing import shared_memory
+    blocks = []
+    specs = {}
+    for name, a in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+        blocks.append(block)
+        specs[name] = (block.name, a.shape, a.dtype.str)
+        _Array(block, specs[name])[...] = a
+    return blocks, specs
+
+def _Array(block, spec):
+    _, shape, dtype = spec
+    return numpy.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+# Classifier, queries and result a worker process attached to by _Attach
+_worker = {}
+
+def _Attach(specs):
+    from multiprocessing import shared_memory
+    arrays = {}
+    for name, spec in specs.items():
+        block = shared_memory.SharedMemory(name=spec[0])
+        _worker.setdefault("blocks", []).append(block)
+        arrays[name] = _Array(block, spec)
+    tree = KDTree.__new__(KDTree)
+    for name, a in arrays.items():
+        if name.startswith("tree."):
+            setattr(tree, name[len("tree."):], a)
+    classifier = Classifier.__new__(Classifier)
+    classifier.labels = arrays["labels"]
+    classifier.classes = arrays["classes"].item()
+    classifier.tree = tree
+    _worker["classifier"] = classifier
+    _worker["m"] = arrays["m"]
+    _worker["c"] = arrays["c"]
+
+def _CategorizeChunk(start, chunk, k):
+    m = _worker["m"][start:start + chunk]
+    _worker["c"][start:start + chunk] = _worker["classifier"].Categorize(m, k)
+
+class GridClassifier:
+    """
+    Approximate k-nearest-neighbor classifier over a uniform grid of cells
+    A query only ranks the points in the cells around its own: the rings of
+    cells needed to find k points, plus probe more rings. Raising probe
+    trades latency for agreement with Classifier.
+    """
+
+    def __init__(self, model, k=101, probe=1, cell=None):
+        features = numpy.asarray(model.features)
+        if len(features) == 0:
+            raise ValueError("Must provide at least one point")
+        self.k = k
+        self.probe = probe
+        self.classes = model.classes
+        self.lo = features.min(axis=0)
+        hi = features.max(axis=0)
+        if cell is None:
+            # About k points per cell on average over the bounding box of
+            # the axes that vary; constant axes get a single cell
+            extent = (hi - self.lo)[hi > self.lo]
+            if len(extent):
+                cell = (numpy.prod(extent) * min(k, len(features)) / len(features)) ** (1 / len(extent))
+            else:
+                cell = 1.0
+        self.cell = cell
+        self.shape = numpy.floor((hi - self.lo) / cell).astype(int) + 1
+        keys = numpy.ravel_multi_index(self.Cells(features).T, self.shape)
+        self.index = numpy.argsort(keys, kind="stable")
+        self.points = features[self.index]
+        self.labels = model.labels[self.index]
+        self.keys, self.first = numpy.unique(keys[self.index], return_index=True)
+        self.last = numpy.append(self.first[1:], len(features))
+        self.coords = numpy.stack(numpy.unravel_index(self.keys, self.shape), axis=-1)
+
+    def Cells(self, points):
+        """
+        Grid coordinates of the cell of each point, clamped to the grid
+        """
+        return numpy.clip(numpy.floor((points - self.lo) / self.cell).astype(int), 0, self.shape - 1)
+
+    def Rings(self, cell, count):
+        """
+        Fewest rings of cells around cell that hold at least count points
+        """
+        distance = numpy.max(numpy.abs(self.coords - cell), axis=1)
+        held = numpy.cumsum(numpy.bincount(distance, weights=self.last - self.first))
+        return int(numpy.searchsorted(held, count))
+
+    def Candidates(self, cell, rings):
+        """
+        Positions of the points in the cells at most rings cells from cell
+        """
+        lo = numpy.maximum(cell - rings, 0)
+        hi = numpy.minimum(cell + rings + 1, self.shape)
+        if numpy.prod(hi - lo, dtype=float) > len(self.keys):
+            # Fewer occupied cells than cells in range, so scan those instead
+            pos = numpy.flatnonzero(numpy.all((self.coords >= lo) & (self.coords < hi), axis=1))
+        else:
+            spans = [numpy.arange(l, h) for l, h in zip(lo, hi)]
+            cells = numpy.stack(numpy.meshgrid(*spans, indexing="ij"), axis=-1).reshape(-1, len(cell))
+            keys = numpy.ravel_multi_index(cells.T, self.shape)
+            pos = numpy.searchsorted(self.keys, keys)
+            found = pos < len(self.keys)
+            pos, keys = pos[found], keys[found]
+            pos = pos[self.keys[pos] == keys]
+        return numpy.concatenate([numpy.arange(self.first[p], self.last[p]) for p in pos] or [numpy.empty(0, dtype=int)])
+
+    def Categorize(self, m, k=None, probe=None, block=256):
+        if k is None:
+            k = self.k
+        if probe is None:
+            probe = self.probe
+        m = numpy.atleast_2d(numpy.asarray(m, dtype=self.points.dtype))
+        c = numpy.empty(len(m), dtype=int)
+        cells = self.Cells(m)
+        keys = numpy.ravel_multi_index(cells.T, self.shape)
+        order = numpy.argsort(keys, kind="stable")
+        runs = numpy.split(order, numpy.flatnonzero(numpy.diff(keys[order])) + 1)
+        for run in runs:
+            cell = cells[run[0]]
+            rings = self.Rings(cell, min(k, len(self.points)))
+            candidates = self.Candidates(cell, rings + probe)
+            for i in range(0, len(run), block):
+                rows = run[i:i + block]
+                d = SquaredDistances(self.points[candidates], m[rows])
+                near = SelectNearestRows(d, k, self.labels[candidates], self.index[candidates])
+                c[rows] = Vote(self.labels[candidates[near]], self.classes)
+        return c
+
+def Evaluate(approximate, exact, m, sample=1000, seed=0):
+    """
+    Compare an approximate classifier with an exact one on a sample of m
+    Returns the fraction of the sample both categorize the same, and the
+    seconds each took.
+    """
+    m = numpy.atleast_2d(m)
+    rows = numpy.random.default_rng(seed).choice(len(m), size=min(sample, len(m)), replace=False)
+    q = m[numpy.sort(rows)]
+    start = time.perf_counter()
+    a = approximate.Categorize(q)
+    middle = time.perf_counter()
+    e = exact.Categorize(q)
+    end = time.perf_counter()
+    return {
+        "agreement": float(numpy.mean(a == e)),
+        "approximate_seconds": middle - start,
+        "exact_seconds": end - middle,
+    }
+
+def DecisionMap(classifier, lo=(0, 0), hi=(6, 6), resolution=1000, step=1, chunk=65536):
+    """
+    Labels the classifier gives a resolution x resolution grid over lo..hi
+    Element [i, j] is the label of the point (u[j], v[i]), where u and v
+    evenly divide lo[0]..hi[0] and lo[1]..hi[1].
+
+    With step > 1 only every step-th row and column is categorized at
+    first. Cells whose four corners agree are filled with their label and
+    the rest are refined at half the step, until step 1. Regions narrower
+    than step points may be missed; step 1 categorizes every point.
+    """
+    u = numpy.linspace(lo[0], hi[0], resolution)
+    v = numpy.linspace(lo[1], hi[1], resolution)
+    raster = numpy.full((resolution, resolution), -1, dtype=int)
+    step = max(min(step, resolution - 1), 1)
+    pixels = numpy.arange(resolution)
+    while True:
+        # Categorize the unknown points on every step-th row and column
+        lattice = (pixels % step == 0) | (pixels == resolution - 1)
+        rows, columns = numpy.nonzero((raster < 0) & lattice[:, numpy.newaxis] & lattice)
+        for start in range(0, len(rows), chunk):
+            i, j = rows[start:start + chunk], columns[start:start + chunk]
+            raster[i, j] = classifier.Categorize(numpy.column_stack((u[j], v[i])))
+        if step == 1:
+            break
+        # Fill the cells between lattice lines whose corners agree
+        lines = numpy.flatnonzero(lattice)
+        corners = raster[numpy.ix_(lines, lines)]
+        agree = ((corners[:-1, :-1] == corners[1:, :-1]) & (corners[:-1, :-1] == corners[:-1, 1:]) &
+                 (corners[:-1, :-1] == corners[1:, 1:]))
+        cell = numpy.minimum(numpy.searchsorted(lines, pixels, side="right") - 1, len(lines) - 2)
+        fill = agree[numpy.ix_(cell, cell)] & (raster < 0)
+        raster[fill] = corners[:-1, :-1][numpy.ix_(cell, cell)][fill]
+        step //= 2
+    return raster
+
+def PlotDecisionMap(raster, lo=(0, 0), hi=(6, 6), cmap="RdYlGn"):
+    """
+    Draw a DecisionMap raster with a single imshow
+    """
+    import matplotlib.pyplot as fig
+    return fig.imshow(raster, origin="lower", extent=(lo[0], hi[0], lo[1], hi[1]), cmap=cmap, alpha=0.5, interpolation="nearest")
 
 if __name__ == "__main__":
     import matplotlib.pyplot as fig
     x,y = GetModel()
+    classifier = Classifier(Combine(x, y))
+    PlotDecisionMap(DecisionMap(classifier, step=16))
     fig.plot(x[:,0], x[:,1],'b.')
     fig.plot(y[:,0], y[:,1],'b.')
-    for i in range(0,1000):
-        m = 6 * numpy.random.rand(2)
-        c = Categorize(x, y, m)
-        if c == 0:
-            fig.plot(m[0],m[1],'r.')
-        else:
-            fig.plot(m[0],m[1],'g.')
+    m = 6 * numpy.random.rand(1000, 2)
+    c = classifier.Categorize(m)
+    fig.plot(m[c == 0, 0], m[c == 0, 1], 'r.')
+    fig.plot(m[c == 1, 0], m[c == 1, 1], 'g.')
 
     fig.show()
-
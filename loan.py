@@ -1,12 +1,43 @@
+from array import array
 from decimal import *
+from functools import lru_cache
+from itertools import islice
 from math import log
+import csv
+import struct
 
 class Loan:
+    """Fixed-rate loan
 
-    def __init__(self, principal, interest_rate, months=0, monthly_payment=0):
+    mode selects the arithmetic. None keeps the amounts as given, "float"
+    converts them to float once and schedules without rounding, and
+    "decimal" converts them to Decimal and does all arithmetic in context,
+    with the payment, given or computed, and every scheduled amount
+    rounded to cents. Its
+    totals are those of that schedule, including the last payment, which
+    pays off whatever balance is left.
+    """
+
+    def __init__(self, principal, interest_rate, months=0, monthly_payment=0, mode=None, context=None, cents=Decimal("0.01")):
+        if mode == "float":
+            principal = float(principal)
+            interest_rate = float(interest_rate)
+            monthly_payment = float(monthly_payment)
+        elif mode == "decimal":
+            self.context = context if context is not None else Context(rounding=ROUND_HALF_UP)
+            self.cents = cents
+            principal = _decimal(principal)
+            interest_rate = _decimal(interest_rate)
+            monthly_payment = _decimal(monthly_payment).quantize(cents, context=self.context)
+        elif mode is not None:
+            raise ValueError("mode must be None, \"float\" or \"decimal\"")
+        self.mode = mode
         self.principal = principal
         self.interest_rate = interest_rate
-        self.monthly_rate = self.interest_rate / 12
+        if mode == "decimal":
+            self.monthly_rate = self.context.divide(self.interest_rate, 12)
+        else:
+            self.monthly_rate = self.interest_rate / 12
         if months != 0:
             self.months = months
             self.monthly_payment = self.__monthly_payment()
@@ -15,8 +46,16 @@ class Loan:
             self.months = self.__months()
         else:
             raise ValueError("Must provide months or monthly_payment")
-        self.total_payment = self.months * self.monthly_payment
-        self.total_interest = self.total_payment - self.principal
+        if mode == "decimal":
+            # Totals of the schedule, whose last payment pays off what is left
+            total_principal, total_interest = Decimal(0), Decimal(0)
+            for row in self.__iter_decimal():
+                total_principal, total_interest = row[4], row[5]
+            self.total_payment = self.context.add(total_principal, total_interest)
+            self.total_interest = total_interest
+        else:
+            self.total_payment = self.months * self.monthly_payment
+            self.total_interest = self.total_payment - self.principal
 
     def __monthly_payment(self):
         """Calculate monthly payment
@@ -25,6 +64,11 @@ class Loan:
         p((1+r)^m-1)/r = P(1+r)^m
         p = Pr(1+r)^m/((1+r)^m-1)
         """
+        if self.mode == "decimal":
+            c = self.context
+            compound = c.power(c.add(1, self.monthly_rate), self.months)
+            payment = c.divide(c.multiply(c.multiply(self.principal, self.monthly_rate), compound), c.subtract(compound, 1))
+            return payment.quantize(self.cents, context=c)
         compound = (1 + self.monthly_rate) ** self.months
         payment = self.principal * self.monthly_rate * compound / (compound - 1)
         return payment
@@ -37,8 +81,12 @@ class Loan:
         (1+r)^m = p/(p-Pr)
         m = log(p/(p-Pr)) / log(1+r)
         """
-        months = log(self.monthly_payment / (self.monthly_payment - self.principal * self.monthly_rate)) / log(1 + self.monthly_rate)
-        return round(months)
+        if self.mode == "decimal":
+            c = self.context
+            p = self.monthly_payment
+            months = c.divide(c.ln(c.divide(p, c.subtract(p, c.multiply(self.principal, self.monthly_rate)))), c.ln(c.add(1, self.monthly_rate)))
+            return int(months.to_integral_value(rounding=ROUND_HALF_EVEN))
+        return round(payoff_months(self.principal, self.monthly_rate, self.monthly_payment))
 
     def get_months(self):
         return self.months
@@ -52,30 +100,332 @@ class Loan:
     def get_total_interest(self):
         return self.total_interest
 
-    def amortization_schedule(self):
-        month = list(range(1,self.months+1))
-        monthly_principal = []
-        monthly_interest = []
-        monthly_balance = []
-        accumulate_principal = []
-        accumulate_interest = []
+    def iter_schedule(self):
+        """Yield (month, principal, interest, balance, total_principal, total_interest) month by month"""
+        if self.mode == "float":
+            return self.__iter_float()
+        if self.mode == "decimal":
+            return self.__iter_decimal()
+        return self.__iter_rounded()
+
+    def __iter_float(self):
+        rate = self.monthly_rate
+        payment = self.monthly_payment
+        balance = self.principal
+        a_principal = 0.0
+        a_interest = 0.0
+        for i in range(1, self.months+1):
+            interest = balance * rate
+            principal = payment - interest
+            balance -= principal
+            a_principal += principal
+            a_interest += interest
+            yield i, principal, interest, balance, a_principal, a_interest
+
+    def __iter_decimal(self):
+        """Schedule in cents; the last payment pays off what is left"""
+        c = self.context
+        cents = self.cents
+        rate = self.monthly_rate
+        payment = self.monthly_payment
+        balance = self.principal.quantize(cents, context=c)
+        a_principal = Decimal(0)
+        a_interest = Decimal(0)
+        last = self.months
+        for i in range(1, last+1):
+            interest = c.multiply(balance, rate).quantize(cents, context=c)
+            principal = c.subtract(payment, interest)
+            if i == last or principal > balance:
+                principal = balance
+            balance = c.subtract(balance, principal)
+            a_principal = c.add(a_principal, principal)
+            a_interest = c.add(a_interest, interest)
+            yield i, principal, interest, balance, a_principal, a_interest
+
+    def __iter_rounded(self):
         fraction = 8
         balance = round(self.principal, fraction)
         a_principal= 0
         a_interest = 0
-        for i in month:
+        for i in range(1, self.months+1):
             interest = round(balance * self.monthly_rate, fraction)
             principal = round(self.monthly_payment - interest, fraction)
             balance = round(balance - principal, fraction)
-            monthly_principal.append(principal)
-            monthly_interest.append(interest)
-            monthly_balance.append(balance)
             a_principal += principal
-            accumulate_principal.append(a_principal)
             a_interest += interest
-            accumulate_interest.append(a_interest)
+            yield i, principal, interest, balance, a_principal, a_interest
+
+    def schedule(self):
+        return Schedule(self.iter_schedule())
+
+    def amortization_schedule(self):
+        month, monthly_principal, monthly_interest, monthly_balance, accumulate_principal, accumulate_interest = [], [], [], [], [], []
+        for row in self.iter_schedule():
+            month.append(row[0])
+            monthly_principal.append(row[1])
+            monthly_interest.append(row[2])
+            monthly_balance.append(row[3])
+            accumulate_principal.append(row[4])
+            accumulate_interest.append(row[5])
         return month, monthly_principal, monthly_interest, monthly_balance,accumulate_principal,accumulate_interest
 
+def payoff_months(principal, monthly_rate, monthly_payment, log=log):
+    """Unrounded months to pay off principal, m = log(p/(p-Pr)) / log(1+r)
+
+    Pass numpy.log as log to solve arrays of loans at once.
+    """
+    return log(monthly_payment / (monthly_payment - principal * monthly_rate)) / log(1 + monthly_rate)
+
+class QuoteEngine:
+    """Loan quotes for any principal from cached annuity factors
+
+    The monthly payment is P times a factor a = r(1+r)^m/((1+r)^m-1) that
+    only depends on the rate and the months. Factors are kept for the
+    maxsize most recently quoted (rate, months) in float arithmetic, so a
+    quote costs one multiplication after the first. Decimal principals are
+    converted to float.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.annuity_factor = lru_cache(maxsize=maxsize)(self.__annuity_factor)
+
+    @staticmethod
+    def __annuity_factor(interest_rate, months):
+        r = interest_rate / 12
+        if r == 0:
+            return 1 / months
+        compound = (1 + r) ** months
+        return r * compound / (compound - 1)
+
+    def monthly_payment(self, principal, interest_rate, months):
+        return _float(principal) * self.annuity_factor(float(interest_rate), months)
+
+    def total_payment(self, principal, interest_rate, months):
+        return months * self.monthly_payment(principal, interest_rate, months)
+
+    def total_interest(self, principal, interest_rate, months):
+        return self.total_payment(principal, interest_rate, months) - _float(principal)
+
+    def months(self, principal, interest_rate, monthly_payment):
+        """Months to pay off each principal with each monthly payment, as Loan rounds them"""
+        import numpy
+        principal, interest_rate, monthly_payment = numpy.broadcast_arrays(
+            numpy.asarray(principal, dtype=float), numpy.asarray(interest_rate, dtype=float), numpy.asarray(monthly_payment, dtype=float))
+        monthly_rate = interest_rate / 12
+        if numpy.any(monthly_payment <= principal * monthly_rate):
+            raise ValueError("Monthly payment must be more than the monthly interest")
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            months = payoff_months(principal, monthly_rate, monthly_payment, numpy.log)
+        months = numpy.where(monthly_rate == 0, principal / monthly_payment, months)
+        return numpy.rint(months).astype(int)
+
+    def cache_info(self):
+        """Hits, misses, maxsize and current size of the annuity factor cache"""
+        return self.annuity_factor.cache_info()
+
+def _float(value):
+    """float of a Decimal value, other values such as arrays as they are"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _decimal(value):
+    """Decimal of value, floats by their shortest repr rather than their binary expansion"""
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+class Schedule:
+    """Amortization schedule stored as typed columns
+
+    month is an array of ints and the other columns arrays of doubles, so
+    Decimal amounts are kept as floats.
+    """
+
+    __slots__ = ("month", "principal", "interest", "balance", "total_principal", "total_interest")
+
+    def __init__(self, rows=()):
+        self.month = array("q")
+        self.principal = array("d")
+        self.interest = array("d")
+        self.balance = array("d")
+        self.total_principal = array("d")
+        self.total_interest = array("d")
+        for row in rows:
+            self.append(row)
+
+    def append(self, row):
+        month, principal, interest, balance, total_principal, total_interest = row
+        self.month.append(month)
+        self.principal.append(principal)
+        self.interest.append(interest)
+        self.balance.append(balance)
+        self.total_principal.append(total_principal)
+        self.total_interest.append(total_interest)
+
+    def __len__(self):
+        return len(self.month)
+
+    def __iter__(self):
+        return zip(self.month, self.principal, self.interest, self.balance, self.total_principal, self.total_interest)
+
+SCHEDULE_HEADER = ("month", "principal", "interest", "balance", "total_principal", "total_interest")
+SCHEDULE_RECORD = struct.Struct("<q5d")
+
+def write_schedule(rows, file, binary=False, delimiter=",", batch=4096):
+    """Write schedule rows to an open file as they are generated
+
+    Text files get a header and delimited lines through csv. Binary files
+    get SCHEDULE_RECORD records, little-endian int64 month and five doubles,
+    packed batch rows at a time. Rows are never all held in memory.
+    """
+    rows = iter(rows)
+    if not binary:
+        writer = csv.writer(file, delimiter=delimiter, lineterminator="\n")
+        writer.writerow(SCHEDULE_HEADER)
+        writer.writerows(rows)
+        return
+    buffer = bytearray(SCHEDULE_RECORD.size * batch)
+    while True:
+        n = 0
+        for row in islice(rows, batch):
+            SCHEDULE_RECORD.pack_into(buffer, n * SCHEDULE_RECORD.size, *row)
+            n += 1
+        if n == 0:
+            break
+        file.write(memoryview(buffer)[:n * SCHEDULE_RECORD.size])
+
+def annuity_payment(principal, monthly_rate, months):
+    """Calculate monthly payments of arrays of loans as Loan does
+
+    p = Pr(1+r)^m/((1+r)^m-1), and p = P/m without interest
+    """
+    import numpy
+    compound = (1 + monthly_rate) ** months
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        payment = principal * monthly_rate * compound / (compound - 1)
+    return numpy.where(monthly_rate == 0, principal / months, payment)
+
+class Portfolio:
+    """Many fixed-rate loans amortized at once
+
+    principal, interest_rate and months are arrays with one element per
+    loan, or scalars shared by all loans. Each schedule is a 2-D array with
+    a row per loan and a column per month; months past the term of a loan
+    are NaN. Results match Loan to within 1e-9 times the principal.
+    """
+
+    def __init__(self, principal, interest_rate, months):
+        import numpy
+        principal, interest_rate, months = numpy.broadcast_arrays(
+            numpy.asarray(principal, dtype=float), numpy.asarray(interest_rate, dtype=float), numpy.asarray(months, dtype=int))
+        if numpy.any(months <= 0):
+            raise ValueError("Must provide positive months")
+        self.principal = principal
+        self.interest_rate = interest_rate
+        self.monthly_rate = self.interest_rate / 12
+        self.months = months
+        self.monthly_payment = self.__monthly_payment()
+        self.total_payment = self.months * self.monthly_payment
+        self.total_interest = self.total_payment - self.principal
+
+    def __monthly_payment(self):
+        return annuity_payment(self.principal, self.monthly_rate, self.months)
+
+    def get_months(self):
+        return self.months
+
+    def get_monthly_payment(self):
+        return self.monthly_payment
+
+    def get_total_payment(self):
+        return self.total_payment
+
+    def get_total_interest(self):
+        return self.total_interest
+
+    def balance(self, month):
+        """Calculate balance after month payments
+
+        B = P(1+r)^k - p((1+r)^k-1)/r
+        """
+        import numpy
+        r = self.monthly_rate[..., numpy.newaxis]
+        P = self.principal[..., numpy.newaxis]
+        p = self.monthly_payment[..., numpy.newaxis]
+        compound = (1 + r) ** month
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            balance = P * compound - p * (compound - 1) / r
+        return numpy.where(r == 0, P - p * month, balance)
+
+    def amortization_schedule(self):
+        import numpy
+        month = numpy.arange(1, self.months.max(initial=0) + 1)
+        balance = self.balance(numpy.arange(0, len(month) + 1))
+        monthly_interest = balance[..., :-1] * self.monthly_rate[..., numpy.newaxis]
+        monthly_principal = self.monthly_payment[..., numpy.newaxis] - monthly_interest
+        monthly_balance = balance[..., 1:]
+        accumulate_principal = self.principal[..., numpy.newaxis] - monthly_balance
+        accumulate_interest = month * self.monthly_payment[..., numpy.newaxis] - accumulate_principal
+        past = month > self.months[..., numpy.newaxis]
+        schedule = monthly_principal, monthly_interest, monthly_balance, accumulate_principal, accumulate_interest
+        for a in schedule:
+            a[past] = numpy.nan
+        return (month,) + schedule
+
+def simulate(principal, interest_rate, months, paths=10000, rate_volatility=0.0025, extra_probability=0.02, extra_payment=None, seed=0, batch=1000, workers=None):
+    """Monte Carlo payoff of a variable-rate loan with random extra payments
+
+    Each month every path moves its annual rate by a normal step of
+    rate_volatility, floored at 0, and re-amortizes the scheduled balance
+    over the remaining months with annuity_payment. With extra_probability
+    it also pays extra_payment, one initial monthly payment by default,
+    which pays the loan off ahead of schedule. Paths run batch at a time
+    as arrays, batches in a process pool, each batch from its own seed
+    spawned from seed, so results do not depend on workers. Returns the
+    total interest and the payoff month of every path.
+    """
+    import numpy
+    if extra_payment is None:
+        extra_payment = float(annuity_payment(principal, interest_rate / 12, months))
+    seeds = numpy.random.SeedSequence(seed).spawn((paths + batch - 1) // batch)
+    sizes = [min(batch, paths - i * batch) for i in range(len(seeds))]
+    args = ([float(principal)] * len(seeds), [float(interest_rate)] * len(seeds), [months] * len(seeds), sizes,
+            [rate_volatility] * len(seeds), [extra_probability] * len(seeds), [extra_payment] * len(seeds), seeds)
+    if workers == 1:
+        results = list(map(_simulate_batch, *args))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_simulate_batch, *args))
+    total_interest = numpy.concatenate([r[0] for r in results])
+    payoff_month = numpy.concatenate([r[1] for r in results])
+    return total_interest, payoff_month
+
+def _simulate_batch(principal, interest_rate, months, paths, rate_volatility, extra_probability, extra_payment, seed):
+    import numpy
+    rng = numpy.random.default_rng(seed)
+    balance = numpy.full(paths, principal)
+    scheduled = numpy.full(paths, principal)
+    rate = numpy.full(paths, interest_rate)
+    total_interest = numpy.zeros(paths)
+    payoff_month = numpy.full(paths, months)
+    for month in range(1, months + 1):
+        active = balance > 0
+        rate = numpy.maximum(rate + rate_volatility * rng.standard_normal(paths), 0)
+        monthly_rate = rate / 12
+        payment = annuity_payment(scheduled, monthly_rate, months - month + 1)
+        scheduled = scheduled - (payment - scheduled * monthly_rate)
+        interest = balance * monthly_rate
+        extra = numpy.where(rng.random(paths) < extra_probability, extra_payment, 0)
+        principal = numpy.minimum(payment - interest + extra, balance)
+        if month == months:
+            principal = balance
+        total_interest += numpy.where(active, interest, 0)
+        balance = balance - principal
+        payoff_month[active & (balance <= 0)] = month
+    return total_interest, payoff_month
+
 if __name__ == "__main__":
     import argparse
     import sys
@@ -84,15 +434,18 @@ if __name__ == "__main__":
     parser.add_argument("-I", "--InterestRate", help="Interest rate", type=Decimal)
     parser.add_argument("-M", "--Months", help="Number of months to pay off the loan", type=int, default=0)
     parser.add_argument("-p", "--MonthlyPayment", help="Monthly payment", type=Decimal, default=0)
+    parser.add_argument("-m", "--Mode", help="Arithmetic: float, or Decimal rounded to cents", choices=["float", "decimal"], default=None)
+    parser.add_argument("-o", "--Output", help="Write the amortization schedule to this file instead of printing it")
+    parser.add_argument("-b", "--Binary", help="Write --Output as packed binary records instead of CSV", action="store_true")
     args = parser.parse_args()
     print(f"Principal: {args.Principal}")
     print(f"Interest Rate: {args.InterestRate}")
     if args.Months == 0 and args.MonthlyPayment == 0:
         sys.exit("Must provide --Months or --MonthlyPayment")
     if args.Months != 0:
-        loan = Loan(args.Principal, args.InterestRate, months=args.Months)
+        loan = Loan(args.Principal, args.InterestRate, months=args.Months, mode=args.Mode)
     elif args.MonthlyPayment != 0:
-        loan = Loan(args.Principal, args.InterestRate, monthly_payment=args.MonthlyPayment)
+        loan = Loan(args.Principal, args.InterestRate, monthly_payment=args.MonthlyPayment, mode=args.Mode)
     months = loan.get_months()
     print(f"Months: {months}")
     payment = loan.get_monthly_payment()
@@ -102,7 +455,13 @@ if __name__ == "__main__":
     total_interest = loan.get_total_interest()
     print(f"Total Interest: {total_interest}")
     print("Amortization Schedule:")
-    month, principal, interest, balance, total_principal, total_interest = loan.amortization_schedule()
-    print("month\tprincipal\tinterest\tbalance\ttotal_principal\ttotal_interest")
-    for i in range(len(month)):
-        print(f"{month[i]}\t{principal[i]}\t{interest[i]}\t{balance[i]}\t{total_principal[i]}\t{total_interest[i]}")
+    if args.Output:
+        if args.Binary:
+            f = open(args.Output, "wb", buffering=1 << 20)
+        else:
+            f = open(args.Output, "w", newline="", buffering=1 << 20)
+        with f:
+            write_schedule(loan.iter_schedule(), f, binary=args.Binary)
+    else:
+        sys.stdout.flush()
+        write_schedule(loan.iter_schedule(), sys.stdout, delimiter="\t")
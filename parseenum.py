@@ -1,4 +1,7 @@
+from collections import deque
 from enum import IntEnum, IntFlag
+from functools import lru_cache
+from itertools import islice
 
 class AccessMask(IntFlag):
     GENERIC_READ =           0x80000000
@@ -60,40 +63,180 @@ def parseInteger(str):
     else:
         return int(str)
 
-def parseAccessMask(mask):
-    result = []
-    for m in AccessMask:
-        if mask & m.value:
-            result.append(m)
-    return result
-
-def parseCreateDisposition(mask):
-    result = []
-    for m in CreateDisposition:
-        if mask == m.value:
-            result.append(m)
-    return result
-
-def parseCreateOption(mask):
-    result = []
-    for m in CreateOption:
-        if mask & m.value:
-            result.append(m)
-    return result
+def makeFlagParser(flag):
+    """
+    Parser of masks of an IntFlag, same as testing mask & m.value for
+    every member m in order, but with a lookup per byte of the mask.
+
+    Every member must lie within one byte. Entry v of the table of byte b
+    holds the members set in v, and the tables are visited in the order
+    the bytes first appear among the members, so members of one byte must
+    be listed together.
+    """
+    members = [m for m in flag if m.value]
+    order = []
+    for m in members:
+        b = (m.value.bit_length() - 1) // 8
+        if m.value >> (8 * b) << (8 * b) != m.value:
+            raise ValueError(f"{m.name} spans more than one byte")
+        if b not in order:
+            order.append(b)
+        elif order[-1] != b:
+            raise ValueError(f"{m.name} is not listed with the other members of its byte")
+    tables = []
+    for b in order:
+        inbyte = [m for m in members if (m.value.bit_length() - 1) // 8 == b]
+        tables.append((8 * b, tuple(tuple(m for m in inbyte if (v << (8 * b)) & m.value) for v in range(256))))
+
+    def parse(mask):
+        result = []
+        for shift, table in tables:
+            result += table[(mask >> shift) & 0xff]
+        return result
+
+    return parse
+
+def makeEnumParser(enum):
+    """
+    Parser of values of an IntEnum, same as testing value == m.value for
+    every member m, but with a dict lookup.
+    """
+    table = {}
+    for m in enum:
+        table.setdefault(m.value, []).append(m)
+
+    def parse(value):
+        return list(table.get(value, ()))
+
+    return parse
+
+parseAccessMask = makeFlagParser(AccessMask)
+parseCreateDisposition = makeEnumParser(CreateDisposition)
+parseCreateOption = makeFlagParser(CreateOption)
+
+parsers = {
+    "accessmask": parseAccessMask,
+    "createdisposition": parseCreateDisposition,
+    "createoption": parseCreateOption,
+}
+
+@lru_cache(maxsize=65536)
+def formatValue(type, text):
+    """
+    Output line for the value text of an enum type: the value in hex, a
+    tab and the names of its members joined by |. Text that is not an
+    integer gets an error line instead, so one bad value does not stop a
+    stream.
+    """
+    try:
+        value = parseInteger(text.strip())
+    except ValueError:
+        return f"error\tnot an integer: {text.strip()!r}\n"
+    names = "|".join(e.name for e in parsers[type](value))
+    return f"0x{value:08x}\t{names}\n"
+
+def decodeLines(type, texts):
+    return "".join([formatValue(type, t) for t in texts])
+
+def decodeStream(type, texts, out, workers=1, chunk=65536):
+    """
+    Write the formatValue line of every value text to out, chunk values
+    per write. With more than one worker, chunks are decoded in a process
+    pool, at most two per worker in flight, and written in input order.
+    """
+    texts = (t for t in texts if t.strip())
+    chunks = iter(lambda: list(islice(texts, chunk)), [])
+    if workers == 1:
+        for c in chunks:
+            out.write(decodeLines(type, c))
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for c in chunks:
+            pending.append(pool.submit(decodeLines, type, c))
+            if len(pending) >= 2 * workers:
+                out.write(pending.popleft().result())
+        while pending:
+            out.write(pending.popleft().result())
+
+def readColumn(file, column):
+    """
+    Values of the named column of a CSV file
+    """
+    import csv
+    reader = csv.reader(file)
+    header = next(reader, [])
+    if column not in header:
+        raise ValueError(f"No column {column!r} in the CSV header: {', '.join(header)}")
+    index = header.index(column)
+    return (row[index] for row in reader)
+
+# Bulk decoding of numpy arrays of uint32 masks. numpy is only imported
+# when these are used.
+
+def flagMatrix(flag, masks):
+    """
+    Boolean matrix with a row per mask and a column per member of flag,
+    in the order of list(flag)
+    """
+    import numpy
+    values = numpy.asarray(masks, dtype=numpy.uint32)
+    bits = numpy.array([m.value for m in flag], dtype=numpy.uint32)
+    return (values[:, numpy.newaxis] & bits) != 0
+
+def flagCounts(flag, masks):
+    """
+    Number of masks each member of flag is set in
+    Only the distinct masks are decoded, weighted by how often they occur.
+    """
+    import numpy
+    values, counts = numpy.unique(numpy.asarray(masks, dtype=numpy.uint32), return_counts=True)
+    totals = numpy.dot(counts, flagMatrix(flag, values))
+    return {m: int(n) for m, n in zip(flag, totals)}
+
+@lru_cache(maxsize=None)
+def flagParser(flag):
+    return makeFlagParser(flag)
+
+@lru_cache(maxsize=65536)
+def flagString(flag, mask):
+    """
+    Names of the members of flag set in mask, joined by |
+    """
+    return "|".join(m.name for m in flagParser(flag)(mask))
+
+def flagStrings(flag, masks):
+    """
+    flagString of each mask, decoding each distinct mask once
+    """
+    import numpy
+    values, inverse = numpy.unique(numpy.asarray(masks, dtype=numpy.uint32), return_inverse=True)
+    strings = numpy.array([flagString(flag, int(v)) for v in values], dtype=object)
+    return strings[inverse.reshape(-1)]
 
 if __name__ == "__main__":
     import argparse
+    import sys
     parser = argparse.ArgumentParser()
     parser.add_argument("type", help="enum type", choices=["accessmask", "createdisposition", "createoption"], nargs="?", default="accessmask")
     parser.add_argument("value", help="enum value", nargs="?", default="0xffffffff")
+    parser.add_argument("-i", "--input", help="decode every value in this file, - for stdin, one per line")
+    parser.add_argument("-c", "--column", help="read --input as CSV and decode this column")
+    parser.add_argument("-w", "--workers", help="number of worker processes for --input", type=int, default=1)
+    parser.add_argument("--chunk", help="number of values per chunk for --input", type=int, default=65536)
     args = parser.parse_args()
+    if args.input:
+        file = sys.stdin if args.input == "-" else open(args.input, newline="", buffering=1 << 20)
+        with file:
+            try:
+                texts = readColumn(file, args.column) if args.column else file
+            except ValueError as e:
+                sys.exit(str(e))
+            decodeStream(args.type, texts, sys.stdout, args.workers, args.chunk)
+        sys.exit()
     value = parseInteger(args.value)
-    if args.type == "accessmask":
-        flags = parseAccessMask(value)
-    elif args.type == "createdisposition":
-        flags = parseCreateDisposition(value)
-    elif args.type == "createoption":
-        flags = parseCreateOption(value)
+    flags = parsers[args.type](value)
     print(f"0x{value:08x}")
     for e in flags:
         print(f"0x{e.value:08x} {e.name}")
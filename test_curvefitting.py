@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import unittest
+import numpy
+import curvefitting
+
+class TestCurveFitting(unittest.TestCase):
+
+    def setUp(self):
+        numpy.random.seed(0)
+        self.x, self.y = curvefitting.GetSamples(100)
+
+    def test_sample_matrix(self):
+        X = curvefitting.GetSampleMatrix(self.x, 5)
+        n = numpy.arange(6).reshape((6, 1))
+        self.assertTrue(numpy.allclose(X, self.x ** n))
+
+    def test_model_qr(self):
+        for M, l in ((3, 0), (5, 0.001), (9, 0.01)):
+            w, e = curvefitting.GetModel(self.x, self.y, M, l)
+            v, f = curvefitting.GetModelQR(self.x, self.y, M, l)
+            self.assertTrue(numpy.allclose(v, w))
+            self.assertAlmostEqual(f, e)
+        v, f = curvefitting.GetModelQR(self.x, self.y, 3, 0.001, dtype=numpy.float32)
+        self.assertEqual(v.dtype, numpy.float32)
+
+    def test_regularization_path(self):
+        lambdas = numpy.array([0, 0.0001, 0.01, 1])
+        for M in (0, 3, 5):
+            W, E = curvefitting.GetRegularizationPath(self.x, self.y, M, lambdas)
+            self.assertEqual(W.shape, (len(lambdas), 1+M))
+            for l, v, f in zip(lambdas, W, E):
+                w, e = curvefitting.GetModel(self.x, self.y, M, l)
+                self.assertTrue(numpy.allclose(v, w))
+                self.assertAlmostEqual(f, e)
+
+    def test_incremental_model(self):
+        for M, l in ((0, 0), (3, 0), (5, 0.001)):
+            model = curvefitting.IncrementalModel(M, l)
+            model.Update((self.x[i:i+7], self.y[i:i+7]) for i in range(0, len(self.x), 7))
+            v, f = model.GetModel()
+            w, e = curvefitting.GetModel(self.x, self.y, M, l)
+            self.assertTrue(numpy.allclose(v, w))
+            self.assertAlmostEqual(f, e)
+        with self.assertRaises(ValueError):
+            curvefitting.IncrementalModel(3, 0).GetModel()
+
+    def test_cross_validate(self):
+        Ms = [1, 3, 5]
+        lambdas = [0, 0.001, 0.1]
+        M, l, w, table = curvefitting.CrossValidate(self.x, self.y, Ms, lambdas, folds=4, workers=1)
+        self.assertEqual(table.shape, (3, 3))
+        self.assertEqual(table[Ms.index(M), lambdas.index(l)], table.min())
+        self.assertEqual(len(w), 1+M)
+        M2, l2, w2, table2 = curvefitting.CrossValidate(self.x, self.y, Ms, lambdas, folds=4, workers=2)
+        self.assertTrue(numpy.array_equal(table, table2))
+        self.assertEqual((M2, l2), (M, l))
+        self.assertTrue(numpy.array_equal(w2, w))
+
+    def test_predict(self):
+        W, E = curvefitting.GetRegularizationPath(self.x, self.y, 5, [0, 0.001, 0.1])
+        u = numpy.linspace(0, 1, 1000)
+        V = curvefitting.Predict(W, u, chunk=64)
+        for w, v in zip(W, V):
+            self.assertTrue(numpy.allclose(v, numpy.poly1d(w[::-1])(u)))
+        out = numpy.empty((3, 1000))
+        self.assertIs(curvefitting.Predict(W, u, out=out), out)
+        self.assertTrue(numpy.array_equal(out, V))
+        self.assertTrue(numpy.allclose(curvefitting.Predict(W[0], u), V[0]))
+        with self.assertRaises(ValueError):
+            curvefitting.Predict(W, u, out=numpy.empty((2, 1000)))
+
+    def test_headless_import(self):
+        # Importing and fitting must not load matplotlib or the pool modules
+        code = ("import sys, curvefitting, knn\n"
+                "x, y = curvefitting.GetSamples(10)\n"
+                "curvefitting.GetModel(x, y, 3, 0.001)\n"
+                "print(sorted(m for m in ('matplotlib', 'concurrent.futures', 'multiprocessing.shared_memory') if m in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), "[]")
+
+if __name__ == "__main__":
+    unittest.main()
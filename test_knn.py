@@ -0,0 +1,130 @@
+import tempfile
+import unittest
+import numpy
+import knn
+
+class TestKnn(unittest.TestCase):
+
+    def setUp(self):
+        numpy.random.seed(0)
+        self.x, self.y = knn.GetModel()
+        self.m = 6 * numpy.random.rand(200, 2)
+
+    def categorize(self, x, y, m):
+        return numpy.array([knn.Categorize(x, y, p) for p in m])
+
+    def test_select_nearest(self):
+        d = numpy.random.randint(0, 20, 500).astype(float)
+        keys = numpy.random.randint(0, 3, 500)
+        for k in (1, 10, 101, 500, 600):
+            ind = knn.SelectNearest(d, k, keys)
+            expected = numpy.lexsort((keys, d))[:k]
+            self.assertTrue(numpy.array_equal(numpy.sort(ind), numpy.sort(expected)))
+
+    def test_classifier(self):
+        classifier = knn.Classifier(knn.Combine(self.x, self.y))
+        c = classifier.Categorize(self.m)
+        self.assertTrue(numpy.array_equal(c, self.categorize(self.x, self.y, self.m)))
+
+    def test_classifier_ties(self):
+        # Integer points have many equal distances
+        x, y = numpy.round(self.x), numpy.round(self.y)
+        m = numpy.round(self.m)
+        classifier = knn.Classifier(knn.Combine(x, y), leaf_size=16)
+        c = classifier.Categorize(m)
+        self.assertTrue(numpy.array_equal(c, self.categorize(x, y, m)))
+
+    def test_classifier_parallel(self):
+        classifier = knn.Classifier(knn.Combine(self.x, self.y))
+        c = classifier.Categorize(self.m)
+        for processes in (False, True):
+            p = classifier.CategorizeParallel(self.m, workers=2, processes=processes, chunk=30)
+            self.assertTrue(numpy.array_equal(p, c))
+
+    def test_model(self):
+        # Three classes in three dimensions
+        features = numpy.random.randint(0, 5, (600, 3))
+        labels = numpy.random.randint(0, 3, 600)
+        model = knn.Model(features, labels, dtype=numpy.float32)
+        self.assertEqual(model.classes, 3)
+        self.assertEqual(model.labels.dtype, numpy.uint8)
+        m = numpy.random.randint(0, 5, (50, 3))
+        c = knn.Classifier(model, k=15, leaf_size=8).Categorize(m)
+        for p, cp in zip(m, c):
+            d = numpy.sum(numpy.square(features - p), axis=1)
+            near = labels[numpy.lexsort((labels, d))[:15]]
+            votes = numpy.bincount(near, minlength=3)
+            self.assertEqual(cp, numpy.argmax(votes))
+            self.assertEqual(model.Categorize(p, k=15), cp)
+        for bad in ([0, 1, 1, 2], [0, 1, -1, 1]):
+            with self.assertRaises(ValueError):
+                knn.Model(numpy.zeros((4, 2)), bad, classes=2)
+
+    def test_saved_model_stream(self):
+        x, y = numpy.round(self.x), numpy.round(self.y)
+        m = numpy.round(self.m)
+        with tempfile.TemporaryDirectory() as path:
+            knn.SaveModel(path, [(x, numpy.zeros(len(x), dtype=int)), (y, numpy.ones(len(y), dtype=int))])
+            model = knn.LoadModel(path)
+            self.assertIsInstance(model.features.base, numpy.memmap)
+            self.assertEqual(model.classes, 2)
+            c = model.CategorizeStream(m, block=300, chunk=64)
+            del model
+            with self.assertRaises(ValueError):
+                knn.SaveModel(path, [(numpy.zeros(3), numpy.zeros(3, dtype=int))])
+        with tempfile.TemporaryDirectory() as path:
+            # Wider saved labels stay mapped instead of being copied to uint8
+            knn.SaveModel(path, [(x, numpy.zeros(len(x), dtype=int)), (y, numpy.ones(len(y), dtype=int))], label_dtype=numpy.uint16)
+            model = knn.LoadModel(path)
+            self.assertEqual(model.labels.dtype, numpy.uint16)
+            self.assertIsInstance(model.labels.base, numpy.memmap)
+            self.assertTrue(numpy.array_equal(model.CategorizeStream(m), c))
+            del model
+        self.assertTrue(numpy.array_equal(c, self.categorize(x, y, m)))
+
+    def test_grid_classifier(self):
+        model = knn.Combine(self.x, self.y)
+        exact = knn.Classifier(model)
+        grid = knn.GridClassifier(model, probe=0)
+        result = knn.Evaluate(grid, exact, self.m, sample=100)
+        self.assertGreater(result["agreement"], 0.9)
+        # Probing every cell is exact
+        grid = knn.GridClassifier(model, probe=max(grid.shape))
+        self.assertTrue(numpy.array_equal(grid.Categorize(self.m), exact.Categorize(self.m)))
+        # Wide probes in many dimensions only visit the cells of the grid
+        model = knn.Model(numpy.random.rand(2000, 6), numpy.random.randint(0, 2, 2000))
+        m = numpy.random.rand(20, 6)
+        grid = knn.GridClassifier(model, probe=50)
+        self.assertTrue(numpy.array_equal(grid.Categorize(m), knn.Classifier(model).Categorize(m)))
+        # A constant feature does not shrink the cells of the others
+        features = numpy.column_stack((numpy.random.rand(500), numpy.ones(500)))
+        model = knn.Model(features, numpy.random.randint(0, 2, 500))
+        m = numpy.column_stack((numpy.random.rand(5), numpy.ones(5)))
+        grid = knn.GridClassifier(model)
+        self.assertEqual(grid.shape[1], 1)
+        self.assertLess(grid.shape[0], 10)
+        grid = knn.GridClassifier(model, probe=max(grid.shape))
+        self.assertTrue(numpy.array_equal(grid.Categorize(m), knn.Classifier(model).Categorize(m)))
+
+    def test_decision_map(self):
+        model = knn.Combine(self.x, self.y)
+        classifier = knn.Classifier(model)
+        raster = knn.DecisionMap(classifier, resolution=20)
+        u = numpy.linspace(0, 6, 20)
+        for i in range(20):
+            for j in range(20):
+                self.assertEqual(raster[i, j], model.Categorize((u[j], u[i])))
+        coarse = knn.DecisionMap(classifier, resolution=20, step=4)
+        self.assertGreater(numpy.mean(coarse == raster), 0.95)
+        self.assertEqual(knn.DecisionMap(classifier, resolution=1, step=4).shape, (1, 1))
+
+    def test_tree_query(self):
+        points = numpy.concatenate((self.x, self.y))
+        tree = knn.KDTree(points, leaf_size=8)
+        ind = tree.Query(self.m, 5)
+        for p, i in zip(self.m, ind):
+            d = numpy.sum(numpy.square(points - p), axis=1)
+            self.assertTrue(numpy.array_equal(i, numpy.argsort(d, kind="stable")[:5]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import io
+import os
+import subprocess
+import sys
+import unittest
+from decimal import Decimal
+import numpy
+from loan import Loan, Portfolio, QuoteEngine, SCHEDULE_RECORD, simulate, write_schedule
+
+class TestLoan(unittest.TestCase):
+
+    def test_modes(self):
+        default = Loan(Decimal(100000), Decimal("0.05"), months=360)
+        fast = Loan(Decimal(100000), Decimal("0.05"), months=360, mode="float")
+        self.assertIsInstance(fast.get_monthly_payment(), float)
+        self.assertAlmostEqual(fast.get_monthly_payment(), float(default.get_monthly_payment()))
+        self.assertTrue(all(type(v) is float for v in list(fast.iter_schedule())[-1][1:]))
+        exact = Loan(100000, 0.05, months=360, mode="decimal")
+        self.assertEqual(exact.get_monthly_payment(), Decimal("536.82"))
+        rows = list(exact.iter_schedule())
+        self.assertTrue(all(type(v) is Decimal for row in rows for v in row[1:]))
+        self.assertEqual(rows[-1][3], Decimal("0.00"))
+        self.assertEqual(rows[-1][4], Decimal("100000.00"))
+        self.assertEqual(exact.get_total_interest(), rows[-1][5])
+        self.assertEqual(exact.get_total_payment(), rows[-1][4] + rows[-1][5])
+        short = Loan(1000, 0.05, monthly_payment=100, mode="decimal")
+        rows = list(short.iter_schedule())
+        self.assertEqual(short.get_total_interest(), rows[-1][5])
+        self.assertEqual(short.get_total_payment(), sum(row[1] + row[2] for row in rows))
+        given = Loan(20000, 0.07, monthly_payment=Decimal("500.123"), mode="decimal")
+        self.assertEqual(given.get_monthly_payment(), Decimal("500.12"))
+        self.assertTrue(all(v == v.quantize(Decimal("0.01")) for row in given.iter_schedule() for v in row[1:]))
+        self.assertEqual(Loan(100000, 0.05, monthly_payment=Decimal("536.82"), mode="decimal").get_months(), 360)
+        with self.assertRaises(ValueError):
+            Loan(100000, 0.05, months=360, mode="fraction")
+
+    def test_schedule(self):
+        loan = Loan(100000, 0.05, months=360)
+        expected = loan.amortization_schedule()
+        schedule = loan.schedule()
+        self.assertEqual(len(schedule), 360)
+        self.assertEqual(list(schedule.month), expected[0])
+        self.assertEqual(list(schedule.balance), expected[3])
+        self.assertEqual(list(schedule), list(zip(*expected)))
+        with self.assertRaises(AttributeError):
+            schedule.extra = 0
+
+    def test_write_schedule(self):
+        loan = Loan(1000, 0.05, months=12)
+        text = io.StringIO()
+        write_schedule(loan.iter_schedule(), text)
+        lines = text.getvalue().splitlines()
+        self.assertEqual(len(lines), 13)
+        self.assertEqual(lines[1].split(","), [str(v) for v in next(loan.iter_schedule())])
+        data = io.BytesIO()
+        write_schedule(loan.iter_schedule(), data, binary=True, batch=5)
+        records = list(SCHEDULE_RECORD.iter_unpack(data.getvalue()))
+        self.assertEqual(records, list(loan.schedule()))
+
+    def test_quote_engine(self):
+        engine = QuoteEngine(maxsize=2)
+        for principal in (1000, 100000, 250000):
+            loan = Loan(principal, 0.05, months=360)
+            self.assertAlmostEqual(engine.monthly_payment(principal, 0.05, 360), loan.get_monthly_payment())
+            self.assertAlmostEqual(engine.total_payment(principal, 0.05, 360), loan.get_total_payment(), places=6)
+            self.assertAlmostEqual(engine.total_interest(principal, 0.05, 360), loan.get_total_interest(), places=6)
+        info = engine.cache_info()
+        self.assertEqual((info.hits, info.misses), (8, 1))
+        engine.monthly_payment(1000, 0.06, 360)
+        engine.monthly_payment(1000, 0.07, 360)
+        self.assertEqual(engine.cache_info().currsize, 2)
+        months = engine.months([100000, 200000], [0.05, 0.04], [536.82, 1000])
+        self.assertEqual(list(months), [Loan(100000, 0.05, monthly_payment=536.82).get_months(), Loan(200000, 0.04, monthly_payment=1000).get_months()])
+        with self.assertRaises(ValueError):
+            engine.months(100000, 0.05, 400)
+        self.assertEqual(list(engine.months([12000, 10000], [0, 0.05], [1000, 1000])), [12, 10])
+        interest = Loan(100000, 0.05, months=360).get_total_interest()
+        self.assertAlmostEqual(engine.total_interest(Decimal(100000), Decimal("0.05"), 360), interest, places=6)
+
+    def test_simulate(self):
+        loan = Loan(300000, 0.065, months=360)
+        total_interest, payoff_month = simulate(300000, 0.065, 360, paths=50, rate_volatility=0, extra_probability=0, batch=20, workers=1)
+        self.assertTrue(numpy.allclose(total_interest, loan.get_total_interest()))
+        self.assertTrue(numpy.all(payoff_month == 360))
+        total_interest, payoff_month = simulate(300000, 0.065, 360, paths=50, batch=20, workers=1)
+        self.assertEqual(len(total_interest), 50)
+        self.assertTrue(numpy.all(payoff_month <= 360))
+        parallel = simulate(300000, 0.065, 360, paths=50, batch=20, workers=2)
+        self.assertTrue(numpy.array_equal(parallel[0], total_interest))
+        self.assertTrue(numpy.array_equal(parallel[1], payoff_month))
+
+    def test_portfolio(self):
+        principal = numpy.array([100000, 250000, 5000])
+        interest_rate = numpy.array([0.05, 0.0375, 0.12])
+        months = numpy.array([360, 180, 24])
+        portfolio = Portfolio(principal, interest_rate, months)
+        schedule = portfolio.amortization_schedule()
+        self.assertEqual(len(schedule[0]), 360)
+        for i in range(len(principal)):
+            loan = Loan(float(principal[i]), float(interest_rate[i]), months=int(months[i]))
+            tolerance = 1e-9 * principal[i]
+            self.assertAlmostEqual(portfolio.get_monthly_payment()[i], loan.get_monthly_payment(), delta=tolerance)
+            self.assertAlmostEqual(portfolio.get_total_interest()[i], loan.get_total_interest(), delta=tolerance)
+            for expected, actual in zip(loan.amortization_schedule()[1:], schedule[1:]):
+                self.assertTrue(numpy.allclose(actual[i, :months[i]], expected, rtol=0, atol=tolerance))
+                self.assertTrue(numpy.isnan(actual[i, months[i]:]).all())
+
+    def test_portfolio_zero_rate(self):
+        portfolio = Portfolio(1200, 0, 12)
+        self.assertEqual(portfolio.get_monthly_payment(), 100)
+        self.assertAlmostEqual(portfolio.amortization_schedule()[3][-1], 0)
+
+    def test_scalar_import(self):
+        # Scalar loans must not pay for importing numpy
+        code = ("import sys\n"
+                "from loan import Loan\n"
+                "Loan(100000, 0.05, months=360).amortization_schedule()\n"
+                "print('numpy' in sys.modules)")
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import io
+import random
+import unittest
+import parseenum
+from parseenum import AccessMask, CreateDisposition, CreateOption
+
+class TestParseEnum(unittest.TestCase):
+
+    def masks(self):
+        r = random.Random(0)
+        return [0, 0xffffffff, 0x80000001, 0x1ffffffff, -1] + [r.getrandbits(32) for i in range(1000)]
+
+    def test_access_mask(self):
+        for mask in self.masks():
+            expected = [m for m in AccessMask if mask & m.value]
+            self.assertEqual(parseenum.parseAccessMask(mask), expected)
+
+    def test_create_option(self):
+        for mask in self.masks():
+            expected = [m for m in CreateOption if mask & m.value]
+            self.assertEqual(parseenum.parseCreateOption(mask), expected)
+
+    def test_create_disposition(self):
+        for value in range(-1, 8):
+            expected = [m for m in CreateDisposition if value == m.value]
+            self.assertEqual(parseenum.parseCreateDisposition(value), expected)
+
+    def test_bulk(self):
+        import numpy
+        masks = numpy.array([m for m in self.masks() if 0 <= m <= 0xffffffff] * 3, dtype=numpy.uint32)
+        matrix = parseenum.flagMatrix(AccessMask, masks)
+        self.assertEqual(matrix.shape, (len(masks), len(AccessMask)))
+        for mask, row in zip(masks[:50], matrix):
+            self.assertEqual([m for m, set in zip(AccessMask, row) if set], parseenum.parseAccessMask(int(mask)))
+        counts = parseenum.flagCounts(CreateOption, masks)
+        for m in CreateOption:
+            self.assertEqual(counts[m], sum(1 for mask in masks if int(mask) & m.value))
+        strings = parseenum.flagStrings(CreateOption, masks)
+        for mask, s in zip(masks[:50], strings):
+            self.assertEqual(s, "|".join(m.name for m in parseenum.parseCreateOption(int(mask))))
+
+    def test_decode_stream(self):
+        texts = [f"0x{m:x}\n" if m % 2 else f"{m}\n" for m in self.masks() if m >= 0] + ["\n"]
+        expected = "".join(f"0x{int(t, 0):08x}\t" + "|".join(m.name for m in parseenum.parseAccessMask(int(t, 0))) + "\n"
+                           for t in texts if t.strip())
+        for workers in (1, 2):
+            out = io.StringIO()
+            parseenum.decodeStream("accessmask", iter(texts), out, workers=workers, chunk=100)
+            self.assertEqual(out.getvalue(), expected)
+
+    def test_read_column(self):
+        file = io.StringIO("time,mask\n1,0x3\n2,5\n")
+        out = io.StringIO()
+        parseenum.decodeStream("createdisposition", parseenum.readColumn(file, "mask"), out)
+        self.assertEqual(out.getvalue(), "0x00000003\tFILE_OPEN_IF\n0x00000005\tFILE_OVERWRITE_IF\n")
+        with self.assertRaisesRegex(ValueError, "'nope'"):
+            parseenum.readColumn(io.StringIO("time,mask\n"), "nope")
+
+    def test_decode_errors(self):
+        out = io.StringIO()
+        parseenum.decodeStream("createdisposition", iter(["1\n", "zz\n", "0x2\n"]), out)
+        self.assertEqual(out.getvalue(), "0x00000001\tFILE_OPEN\nerror\tnot an integer: 'zz'\n0x00000002\tFILE_CREATE\n")
+
+if __name__ == "__main__":
+    unittest.main()